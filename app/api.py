@@ -1,28 +1,46 @@
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-
-from pinecone import Pinecone
-
-from app.config import PINECONE_API_KEY, PINECONE_INDEX_NAME
-from app.rag import retrieve, answer_with_rag
-
+from fastapi.responses import ORJSONResponse, StreamingResponse
+import orjson
+from pydantic import BaseModel, Field
+
+from app.cache import get_semantic_cache
+from app.clients import get_pinecone_client
+from app.rag import (
+    answer_with_rag_async,
+    embed_query_async,
+    embedding_batcher,
+    retrieve_async,
+    retrieve_by_vector_async,
+    stream_answer_with_rag,
+)
 
-pinecone_client = Pinecone(api_key=PINECONE_API_KEY)
-index = pinecone_client.Index(PINECONE_INDEX_NAME)
+__all__ = ["app"]
 
 app = FastAPI(
     title="Typeform Help Center RAG API",
     description="RAG chatbot over Typeform Help Center articles",
     version="0.1.0",
+    default_response_class=ORJSONResponse,
 )
 
 
+@app.on_event("startup")
+async def start_embedding_batcher():
+    await embedding_batcher.start()
+
+
+@app.on_event("shutdown")
+async def stop_embedding_batcher():
+    await embedding_batcher.stop()
+
+
 # ---------- Pydantic models ----------
 
 class ChatRequest(BaseModel):
-    query: str
+    # Empty queries are rejected here rather than sent to the embeddings API.
+    query: str = Field(min_length=1)
     top_k: int = 5
 
 class ChunkMatch(BaseModel):
@@ -57,49 +75,114 @@ def health():
     Simple health check: confirms we can talk to Pinecone.
     """
     try:
-        _ = pinecone_client.list_indexes()
+        _ = get_pinecone_client().list_indexes()
         return {"status": "ok"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/ask_question", response_model=ChatResponse)
-def ask_question(request: ChatRequest):
+def build_sources(matches) -> List[Dict[str, Any]]:
+    """
+    Convert raw Pinecone matches into plain dicts shaped like
+    `ChunkMatch`. Matches come from our own index, so they are not
+    validated; Pinecone returns numeric metadata as floats, so
+    chunk_index is cast back to int.
+    """
+    sources: List[Dict[str, Any]] = []
+    for m in matches:
+        md = m["metadata"]
+        chunk_index = md.get("chunk_index")
+        sources.append(
+            {
+                "id": m["id"],
+                "score": m["score"],
+                "text": md.get("text", ""),
+                "article_id": md.get("article_id"),
+                "title": md.get("title"),
+                "url": md.get("url"),
+                "chunk_index": int(chunk_index) if chunk_index is not None else None,
+            }
+        )
+    return sources
+
+
+def sse_event(event: str, data) -> str:
+    """
+    Format a single Server-Sent Event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+
+# response_model=None skips re-validating every response; `responses`
+# keeps ChatResponse in the OpenAPI docs.
+@app.post(
+    "/ask_question",
+    response_model=None,
+    responses={200: {"model": ChatResponse}},
+)
+async def ask_question(request: ChatRequest):
     """
     RAG-powered chat endpoint:
     - Embeds the query
-    - Retrieves top_k chunks from Pinecone
-    - Generates an answer with GPT
+    - Returns a cached response for a near-identical earlier query
+    - Otherwise retrieves top_k chunks from Pinecone (once)
+    - Generates an answer with GPT from those same chunks
     - Returns answer + sources
     """
     try:
-        matches = retrieve(request.query, top_k=request.top_k)
+        query_vec = await embed_query_async(request.query)
+        semantic_cache = get_semantic_cache()
+        cached = semantic_cache.get(query_vec, request.top_k)
+        if cached is not None:
+            return cached
+
+        matches = await retrieve_by_vector_async(query_vec, top_k=request.top_k)
         if not matches:
             raise HTTPException(
                 status_code=404,
                 detail="No relevant context found in the knowledge base.",
             )
 
-        answer = answer_with_rag(request.query, top_k=request.top_k)
-
-        sources: List[ChunkMatch] = []
-        for m in matches:
-            md = m["metadata"]
-            sources.append(
-                ChunkMatch(
-                    id=m["id"],
-                    score=m["score"],
-                    text=md.get("text", ""),
-                    article_id=md.get("article_id"),
-                    title=md.get("title"),
-                    url=md.get("url"),
-                    chunk_index=md.get("chunk_index"),
-                )
-            )
+        answer = await answer_with_rag_async(request.query, matches)
+        sources = build_sources(matches)
 
-        return ChatResponse(answer=answer, sources=sources)
+        response = {"answer": answer, "sources": sources}
+        semantic_cache.put(query_vec, request.top_k, response)
+        return response
 
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/ask_question/stream")
+async def ask_question_stream(request: ChatRequest):
+    """
+    Streaming variant of /ask_question (Server-Sent Events):
+    - `sources` event with the retrieved chunks, sent first
+    - `token` events with answer text as GPT generates it
+    - `done` event at the end (or `error` if generation fails)
+    """
+    try:
+        matches = await retrieve_async(request.query, top_k=request.top_k)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not matches:
+        raise HTTPException(
+            status_code=404,
+            detail="No relevant context found in the knowledge base.",
+        )
+
+    async def events() -> AsyncIterator[str]:
+        sources = build_sources(matches)
+        yield sse_event("sources", sources)
+        try:
+            async for token in stream_answer_with_rag(request.query, matches):
+                yield sse_event("token", token)
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+            return
+        yield sse_event("done", {})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
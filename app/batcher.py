@@ -0,0 +1,139 @@
+import asyncio
+from typing import TYPE_CHECKING, Callable, List, Optional, Set, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+# ---------- Micro-batching of query embeddings ----------
+
+class EmbeddingBatcher:
+    """
+    Coalesce concurrent embedding requests into a single OpenAI call.
+
+    Queries arriving within `max_wait_ms` of the first one (or until
+    `max_batch_size` is reached) are sent together as one `input=[...]`
+    request; each caller awaits its own future for the result.
+    The client comes from `client_factory`, called on the first flush,
+    so neither constructing nor starting a batcher imports the OpenAI SDK.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], "AsyncOpenAI"],
+        model: str = "text-embedding-3-small",
+        max_wait_ms: float = 10.0,
+        max_batch_size: int = 64,
+    ):
+        self.client_factory = client_factory
+        self.client: Optional["AsyncOpenAI"] = None
+        self.model = model
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        """
+        Start the background batching task on the running event loop.
+        """
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the background task and fail any queries still queued.
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+        while not self._queue.empty():
+            _, fut = self._queue.get_nowait()
+            if not fut.done():
+                fut.set_exception(RuntimeError("Embedding batcher stopped."))
+        self._task = None
+        self._queue = None
+
+    async def embed(self, text: str) -> np.ndarray:
+        """
+        Embed a single text, sharing an OpenAI call with any
+        concurrent callers.
+        """
+        if self._task is None:
+            await self.start()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, fut))
+        return await fut
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        batch: List[Tuple[str, asyncio.Future]] = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(
+                            await asyncio.wait_for(self._queue.get(), timeout)
+                        )
+                    except asyncio.TimeoutError:
+                        break
+
+                # Flush in the background so the next batch can start
+                # collecting while this one is in flight.
+                task = asyncio.create_task(self._flush(batch))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+                batch = []
+        except asyncio.CancelledError:
+            # Queries already taken off the queue but not yet flushed.
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(RuntimeError("Embedding batcher stopped."))
+            raise
+
+    async def _flush(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        from openai import BadRequestError
+
+        if self.client is None:
+            self.client = self.client_factory()
+        try:
+            resp = await self.client.embeddings.create(
+                model=self.model,
+                input=[text for text, _ in batch],
+            )
+        except BadRequestError as e:
+            # One invalid input rejects the whole request; retry each
+            # item alone so only the offending caller sees the error.
+            if len(batch) > 1:
+                await asyncio.gather(*(self._flush([item]) for item in batch))
+                return
+            _, fut = batch[0]
+            if not fut.done():
+                fut.set_exception(e)
+            return
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        for d in resp.data:
+            _, fut = batch[d.index]
+            if not fut.done():
+                fut.set_result(np.asarray(d.embedding, dtype=np.float32))
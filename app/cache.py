@@ -0,0 +1,144 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+
+# Entries older than this are treated as misses by both caches.
+DEFAULT_CACHE_TTL = 3600.0
+
+
+# ---------- Query embedding cache ----------
+
+def make_query_key(query: str) -> str:
+    """
+    Cache key for a user query: normalized (stripped, lowercased)
+    and hashed so keys stay small regardless of query length.
+    """
+    return hashlib.blake2b(query.strip().lower().encode("utf-8")).hexdigest()
+
+
+class LRUEmbeddingCache:
+    """
+    Thread-safe in-process LRU cache with a TTL, mapping query keys
+    to float32 embedding vectors.
+    """
+
+    def __init__(self, capacity: int = 1024, ttl: float = DEFAULT_CACHE_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            stored_at, vec = item
+            if time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return vec
+
+    def put(self, key: str, vec: np.ndarray) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), vec)
+            self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+# ---------- Semantic response cache ----------
+
+class SemanticResponseCache:
+    """
+    Fixed-size FIFO ring buffer of (query embedding, response) pairs.
+    A new query whose embedding has cosine similarity >= `threshold`
+    with a cached one (for the same top_k) reuses that response.
+    Entries older than `ttl` seconds are ignored, so answers refresh
+    after a re-ingest.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 512,
+        dim: int = 1536,
+        threshold: float = 0.97,
+        ttl: float = DEFAULT_CACHE_TTL,
+    ):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self._vecs = np.zeros((capacity, dim), dtype=np.float32)
+        self._top_ks = np.full(capacity, -1, dtype=np.int64)  # -1 = empty slot
+        self._stored_at = np.full(capacity, -np.inf)
+        self._responses: list = [None] * capacity
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vec: np.ndarray) -> np.ndarray:
+        vec = np.asarray(vec, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def get(self, query_vec: np.ndarray, top_k: int) -> Optional[Dict[str, Any]]:
+        q = self._normalize(query_vec)
+        with self._lock:
+            sims = self._vecs @ q
+            expired = time.monotonic() - self._stored_at > self.ttl
+            sims[(self._top_ks != top_k) | expired] = -1.0
+            best = int(np.argmax(sims))
+            if sims[best] >= self.threshold:
+                return self._responses[best]
+        return None
+
+    def put(self, query_vec: np.ndarray, top_k: int, response: Dict[str, Any]) -> None:
+        q = self._normalize(query_vec)
+        with self._lock:
+            slot = self._next
+            self._vecs[slot] = q
+            self._top_ks[slot] = top_k
+            self._stored_at[slot] = time.monotonic()
+            self._responses[slot] = response
+            self._next = (slot + 1) % self.capacity
+
+
+# ---------- Process-wide instances ----------
+
+_embedding_cache: Optional[LRUEmbeddingCache] = None
+_semantic_cache: Optional[SemanticResponseCache] = None
+_singleton_lock = threading.Lock()
+
+
+def get_embedding_cache() -> LRUEmbeddingCache:
+    """
+    Process-wide query embedding cache (created on first use).
+    """
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _singleton_lock:
+            if _embedding_cache is None:
+                _embedding_cache = LRUEmbeddingCache()
+    return _embedding_cache
+
+
+def get_semantic_cache() -> SemanticResponseCache:
+    """
+    Process-wide semantic response cache (created on first use).
+    """
+    global _semantic_cache
+    if _semantic_cache is None:
+        with _singleton_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticResponseCache()
+    return _semantic_cache
@@ -0,0 +1,116 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import threading
+from typing import TYPE_CHECKING, Optional
+
+from app.config import OPENAI_API_KEY, PINECONE_API_KEY
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+    from pinecone import Pinecone
+
+
+# ---------- Shared API clients ----------
+# The SDKs (openai, httpx, pinecone) are imported and the clients built
+# on first use, so importing the API app stays cheap at cold start.
+
+# Keep-alive pool (with HTTP/2 multiplexing) shared by every OpenAI call,
+# so requests reuse connections instead of paying a TLS handshake each time.
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 50
+HTTP_TIMEOUT_SECONDS = 30.0
+
+_openai_client: Optional["OpenAI"] = None
+_async_openai_client: Optional["AsyncOpenAI"] = None
+_pinecone_client: Optional["Pinecone"] = None
+_clients_lock = threading.Lock()
+
+
+def _http_client_kwargs() -> dict:
+    import httpx
+
+    return {
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        "http2": True,
+        "timeout": httpx.Timeout(HTTP_TIMEOUT_SECONDS),
+    }
+
+
+def make_async_openai_client() -> "AsyncOpenAI":
+    """
+    Create an AsyncOpenAI client with its own pooled HTTP/2 connection.
+    Use this for work on a short-lived event loop (e.g. `asyncio.run`
+    during ingestion), since async connections are tied to their loop.
+    """
+    import httpx
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(
+        api_key=OPENAI_API_KEY,
+        http_client=httpx.AsyncClient(**_http_client_kwargs()),
+    )
+
+
+def get_openai_client() -> "OpenAI":
+    """
+    Process-wide sync OpenAI client (created on first use).
+    """
+    global _openai_client
+    if _openai_client is None:
+        with _clients_lock:
+            if _openai_client is None:
+                import httpx
+                from openai import OpenAI
+
+                _openai_client = OpenAI(
+                    api_key=OPENAI_API_KEY,
+                    http_client=httpx.Client(**_http_client_kwargs()),
+                )
+    return _openai_client
+
+
+def get_async_openai_client() -> "AsyncOpenAI":
+    """
+    Process-wide AsyncOpenAI client for the API server's event loop
+    (created on first use).
+    """
+    global _async_openai_client
+    if _async_openai_client is None:
+        with _clients_lock:
+            if _async_openai_client is None:
+                _async_openai_client = make_async_openai_client()
+    return _async_openai_client
+
+
+def get_pinecone_client() -> "Pinecone":
+    """
+    Process-wide Pinecone client (created on first use).
+    """
+    global _pinecone_client
+    if _pinecone_client is None:
+        with _clients_lock:
+            if _pinecone_client is None:
+                from pinecone import Pinecone
+
+                _pinecone_client = Pinecone(api_key=PINECONE_API_KEY)
+    return _pinecone_client
+
+
+# The Pinecone client is blocking; async code runs its calls on these
+# threads so the event loop keeps serving requests during ANN search,
+# without competing with other work in the default executor.
+pinecone_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="pinecone")
+
+
+async def run_pinecone(fn, *args, **kwargs):
+    """
+    Await a blocking Pinecone call without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        pinecone_executor, functools.partial(fn, *args, **kwargs)
+    )
@@ -9,6 +9,10 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "typeform-helpcenter")
 APP_ENV = os.getenv("APP_ENV", "local")
+# Minimum top-match cosine similarity before we call the LLM; below it
+# we answer "couldn't find" directly. Typical text-embedding-3-small
+# scores for on-topic matches are above ~0.3.
+RETRIEVAL_SCORE_THRESHOLD = float(os.getenv("RETRIEVAL_SCORE_THRESHOLD", "0.25"))
 
 
 def validate_config() -> None:
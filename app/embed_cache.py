@@ -0,0 +1,71 @@
+import hashlib
+from pathlib import Path
+import sqlite3
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+
+# ---------- On-disk chunk embedding cache ----------
+
+DEFAULT_CACHE_PATH = (
+    Path(__file__).resolve().parent.parent / "data" / "cache" / "embeddings.sqlite"
+)
+
+# Vectors are stored as float16 to halve the on-disk size.
+STORAGE_DTYPE = np.float16
+
+# Stay well under SQLite's limit on bound parameters per statement.
+_LOOKUP_BATCH_SIZE = 500
+
+
+def make_embedding_key(model: str, text: str) -> str:
+    """
+    Content-addressed key for a chunk embedding: depends on both the
+    embedding model and the exact chunk text.
+    """
+    return hashlib.blake2b(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    SQLite-backed store of `key -> float16 vector`, so re-ingesting
+    unchanged chunks doesn't re-embed them.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings_f16 (key TEXT PRIMARY KEY, vec BLOB)"
+        )
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up the given keys; missing keys are absent from the result.
+        """
+        found: Dict[str, np.ndarray] = {}
+        for i in range(0, len(keys), _LOOKUP_BATCH_SIZE):
+            batch = keys[i : i + _LOOKUP_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.conn.execute(
+                f"SELECT key, vec FROM embeddings_f16 WHERE key IN ({placeholders})",
+                batch,
+            )
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=STORAGE_DTYPE)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, np.ndarray]]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings_f16 (key, vec) VALUES (?, ?)",
+                (
+                    (key, np.asarray(vec, dtype=STORAGE_DTYPE).tobytes())
+                    for key, vec in items
+                ),
+            )
+
+    def close(self) -> None:
+        self.conn.close()
@@ -1,17 +1,30 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import math
+import os
 from pathlib import Path
+import random
 import re
 import unicodedata
-from typing import List, Dict
+from typing import TYPE_CHECKING, List, Dict
 
-from bs4 import BeautifulSoup
-from openai import OpenAI
-from pinecone import Pinecone, ServerlessSpec
+import numpy as np
 
-from app.config import OPENAI_API_KEY, PINECONE_API_KEY, PINECONE_INDEX_NAME
+from app.clients import get_pinecone_client, make_async_openai_client, run_pinecone
+from app.config import PINECONE_INDEX_NAME
+from app.embed_cache import EmbeddingStore, make_embedding_key
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 
 # ---------- ID utilities ----------
 
+# Hyphens count as unsafe too, so any run of unsafe chars and/or
+# hyphens collapses to a single "-" in one pass.
+_UNSAFE_ID_CHARS_RE = re.compile(r"[^a-zA-Z0-9_]+")
+
+
 def make_pinecone_id(raw: str, max_len: int = 64) -> str:
     """
     Turn an arbitrary string into a safe Pinecone ID:
@@ -20,10 +33,13 @@ def make_pinecone_id(raw: str, max_len: int = 64) -> str:
     - Keep only letters, digits, hyphen, underscore
     - Collapse repeats and trim length
     """
-    raw_norm = unicodedata.normalize("NFKD", raw)
-    raw_ascii = raw_norm.encode("ascii", "ignore").decode("ascii")
-    safe = re.sub(r"[^a-zA-Z0-9_-]+", "-", raw_ascii)
-    safe = re.sub(r"-{2,}", "-", safe).strip("-")
+    if raw.isascii():
+        # NFKD is a no-op on ASCII, skip the normalize/encode round trip
+        raw_ascii = raw
+    else:
+        raw_norm = unicodedata.normalize("NFKD", raw)
+        raw_ascii = raw_norm.encode("ascii", "ignore").decode("ascii")
+    safe = _UNSAFE_ID_CHARS_RE.sub("-", raw_ascii).strip("-")
     safe = safe.lower()[:max_len] or "id"
     return safe
 
@@ -34,6 +50,9 @@ STOP_HEADINGS = {
     "was this article helpful?",
     "related articles",
 }
+_STOP_HEADINGS_RE = re.compile(
+    "|".join(map(re.escape, STOP_HEADINGS)), re.IGNORECASE
+)
 
 
 def load_html_docs(root_dir: str = "../data/raw"):
@@ -49,6 +68,29 @@ def load_html_docs(root_dir: str = "../data/raw"):
             )
     return docs
 
+
+async def load_html_docs_async(root_dir: str = "../data/raw", max_open: int = 64):
+    """
+    Async `load_html_docs`: reads files concurrently (at most
+    `max_open` at a time) so total time tracks the slowest read
+    rather than the sum of all reads.
+    """
+    import aiofiles
+
+    sem = asyncio.Semaphore(max_open)
+
+    async def load(path: Path) -> Dict:
+        async with sem:
+            async with aiofiles.open(path, "r", encoding="utf-8") as f:
+                html = await f.read()
+        return {
+            "id": path.stem,
+            "source_path": str(path),
+            "html": html,
+        }
+
+    return await asyncio.gather(*(load(p) for p in Path(root_dir).glob("*.html")))
+
 # def load_html_docs(raw_dir: str = "../data/raw") -> List[Dict]:
 #     """
 #     Load local HTML snapshots of help center articles.
@@ -68,7 +110,10 @@ def extract_article_from_html(html: str, source_path: str) -> Dict:
     - main article content (headings, paragraphs, list items)
     - metadata
     """
-    soup = BeautifulSoup(html, "html.parser")
+    # Imported here so the ID/chunking helpers don't pull in bs4/lxml.
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "lxml")
 
     main = soup.find("main") or soup.body or soup
     title_tag = main.find("h1")
@@ -76,12 +121,13 @@ def extract_article_from_html(html: str, source_path: str) -> Dict:
 
     content_parts: List[str] = []
     if title_tag:
-        for el in title_tag.find_all_next():
+        # Only visit the tags we act on instead of every following node
+        for el in title_tag.find_all_next(["h2", "h3", "h4", "p", "li"]):
             # Stop when we hit typical footer headings
-            if el.name in ("h2", "h3", "h4"):
-                heading_text = el.get_text(" ", strip=True).lower()
-                if any(stop in heading_text for stop in STOP_HEADINGS):
-                    break
+            if el.name in ("h2", "h3", "h4") and _STOP_HEADINGS_RE.search(
+                el.get_text(" ", strip=True)
+            ):
+                break
 
             if el.name in ("p", "h2", "h3", "li"):
                 text = el.get_text(" ", strip=True)
@@ -112,6 +158,25 @@ def extract_article_from_html(html: str, source_path: str) -> Dict:
     }
 
 
+def _extract(doc: Dict) -> Dict:
+    return extract_article_from_html(doc["html"], doc["source_path"])
+
+
+def extract_articles(html_docs: List[Dict]) -> List[Dict]:
+    """
+    Extract articles from loaded HTML docs in a process pool,
+    since HTML parsing is CPU-bound.
+    """
+    if not html_docs:
+        return []
+    max_workers = min(os.cpu_count() or 1, len(html_docs))
+    # ~4 chunks per worker: every worker gets work, with some room to
+    # balance uneven article sizes.
+    chunksize = max(1, math.ceil(len(html_docs) / (max_workers * 4)))
+    with ProcessPoolExecutor(max_workers=max_workers) as ex:
+        return list(ex.map(_extract, html_docs, chunksize=chunksize))
+
+
 # ---------- Chunking ----------
 
 def chunk_text(text: str, max_chars: int = 1200, overlap: int = 200) -> List[str]:
@@ -123,22 +188,20 @@ def chunk_text(text: str, max_chars: int = 1200, overlap: int = 200) -> List[str
     if not text:
         return []
 
-    if overlap >= max_chars:
-        overlap = max_chars // 4  # defensive
-
-    chunks: List[str] = []
     n = len(text)
-    start = 0
+    if n <= max_chars:
+        return [text]
 
-    while start < n:
-        end = min(n, start + max_chars)
-        chunk = text[start:end]
-        chunks.append(chunk)
-        if end == n:
-            break
-        start = end - overlap
+    if overlap >= max_chars:
+        overlap = max_chars // 4  # defensive
 
-    return chunks
+    # Precompute all (start, end) boundaries; the last chunk is the
+    # first one that reaches the end of the text.
+    step = max_chars - overlap
+    n_chunks = -(-(n - max_chars) // step) + 1
+    starts = np.arange(n_chunks, dtype=np.int64) * step
+    ends = np.minimum(starts + max_chars, n)
+    return [text[s:e] for s, e in zip(starts.tolist(), ends.tolist())]
 
 
 def build_chunks(articles: List[Dict]) -> List[Dict]:
@@ -182,78 +245,242 @@ def build_chunks(articles: List[Dict]) -> List[Dict]:
 
 # ---------- Embeddings & Pinecone upsert ----------
 
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
-pinecone_client = Pinecone(api_key=PINECONE_API_KEY)
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIM = 1536
+EMBED_BATCH_SIZE = 256  # inputs per embeddings call
+EMBED_MAX_CONCURRENCY = 10  # embeddings calls in flight
+UPSERT_BATCH_SIZE = 100  # Pinecone per-request vector limit
+UPSERT_MAX_CONCURRENCY = 8  # upsert calls in flight
+# In-process dtype for chunk embeddings; half the memory of float32.
+# Vectors are widened back to float32 only when sent to Pinecone.
+EMBEDDING_DTYPE = np.float16
 
 
 def get_index():
     """
     Get (and lazily create) the Pinecone index used by this app.
     """
+    from pinecone import ServerlessSpec
+
+    pinecone_client = get_pinecone_client()
     existing = [idx.name for idx in pinecone_client.list_indexes()]
     if PINECONE_INDEX_NAME not in existing:
         pinecone_client.create_index(
             name=PINECONE_INDEX_NAME,
-            dimension=1536,  # text-embedding-3-small
+            dimension=EMBEDDING_DIM,  # text-embedding-3-small
             metric="cosine",
             spec=ServerlessSpec(cloud="aws", region="us-east-1"),
         )
     return pinecone_client.Index(PINECONE_INDEX_NAME)
 
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
+def _to_matrix(resp) -> np.ndarray:
     """
-    Embed a batch of texts using text-embedding-3-small.
+    Turn an embeddings response into one contiguous (n, dim) array of
+    unit-norm rows, normalized once in float32 and stored as
+    EMBEDDING_DTYPE.
     """
-    resp = openai_client.embeddings.create(
-        model="text-embedding-3-small",
-        input=texts,
-    )
-    return [d.embedding for d in resp.data]
-
-
-def upsert_chunks(chunks: List[Dict]):
+    vecs = np.asarray([d.embedding for d in resp.data], dtype=np.float32)
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    vecs /= np.where(norms == 0, 1.0, norms)
+    return vecs.astype(EMBEDDING_DTYPE)
+
+
+async def _embed_batch(
+    client: "AsyncOpenAI",
+    texts: List[str],
+    sem: asyncio.Semaphore,
+    max_retries: int = 6,
+) -> np.ndarray:
+    """
+    Embed one batch under the concurrency semaphore, retrying with
+    exponential backoff (plus jitter) when rate limited.
+    Returns an (n, dim) EMBEDDING_DTYPE array.
+    """
+    from openai import RateLimitError
+
+    delay = 1.0
+    async with sem:
+        for attempt in range(max_retries):
+            try:
+                resp = await client.embeddings.create(
+                    model=EMBEDDING_MODEL,
+                    input=texts,
+                )
+                return _to_matrix(resp)
+            except RateLimitError:
+                if attempt == max_retries - 1:
+                    raise
+                await asyncio.sleep(delay + random.uniform(0, delay))
+                delay *= 2
+
+
+def _to_vectors(chunks: List[Dict], embeddings: np.ndarray) -> List[Dict]:
     """
-    Upsert chunk vectors into Pinecone with metadata.
+    Build Pinecone upsert payloads; row i of `embeddings` is the
+    vector for chunks[i]. Rows become float32 lists only here.
     """
-    index = get_index()
-    vectors = [
+    values = embeddings.astype(np.float32).tolist()
+    return [
         {
             "id": c["id"],
-            "values": c["embedding"],
+            "values": vec,
             "metadata": {
                 "text": c["text"],
                 **c["metadata"],
             },
         }
-        for c in chunks
+        for c, vec in zip(chunks, values)
     ]
-    return index.upsert(vectors=vectors)
 
 
-def run_ingestion_once() -> None:
+async def _upsert_worker(index, queue: asyncio.Queue) -> int:
+    """
+    Consume `(chunks, embeddings)` batches from `queue` and upsert them
+    to Pinecone in groups of UPSERT_BATCH_SIZE until a `None` sentinel
+    arrives. Returns the number of vectors upserted.
+
+    At most UPSERT_MAX_CONCURRENCY groups are in flight; the worker
+    stops reading the queue while that many are pending, and each
+    group's float32 payload is only built inside its own upsert.
+    """
+    sem = asyncio.Semaphore(UPSERT_MAX_CONCURRENCY)
+
+    async def upsert_batch(chunks: List[Dict], embeddings: np.ndarray) -> int:
+        try:
+            await run_pinecone(index.upsert, vectors=_to_vectors(chunks, embeddings))
+        finally:
+            sem.release()
+        return len(chunks)
+
+    pending_chunks: List[Dict] = []
+    pending_vecs: List[np.ndarray] = []
+    tasks: List[asyncio.Task] = []
+    upserted = 0
+    try:
+        while True:
+            item = await queue.get()
+            if item is not None:
+                pending_chunks.extend(item[0])
+                pending_vecs.append(item[1])
+            while len(pending_chunks) >= UPSERT_BATCH_SIZE or (
+                item is None and pending_chunks
+            ):
+                vecs = np.concatenate(pending_vecs)
+                group_chunks = pending_chunks[:UPSERT_BATCH_SIZE]
+                group_vecs = vecs[:UPSERT_BATCH_SIZE]
+                pending_chunks = pending_chunks[UPSERT_BATCH_SIZE:]
+                pending_vecs = [vecs[UPSERT_BATCH_SIZE:]]
+
+                await sem.acquire()
+                task = asyncio.create_task(upsert_batch(group_chunks, group_vecs))
+                tasks.append(task)
+                # Collect finished groups (surfacing failures early).
+                for done in [t for t in tasks if t.done()]:
+                    tasks.remove(done)
+                    upserted += done.result()
+            if item is None:
+                return upserted + sum(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def run_ingestion_once_async() -> None:
     """
     End-to-end ingestion:
     - Load HTML snapshots
     - Extract articles
     - Chunk contents
-    - Embed chunks
-    - Upsert to Pinecone
+    - Embed chunks not already in the local embedding cache
+      (batched, bounded concurrency)
+    - Upsert to Pinecone while later embedding batches are in flight
     """
-    html_docs = load_html_docs()
-    articles = [
-        extract_article_from_html(doc["html"], doc["source_path"])
-        for doc in html_docs
-    ]
+    html_docs = await load_html_docs_async()
+    articles = extract_articles(html_docs)
     print(f"Loaded {len(articles)} articles from HTML snapshots.")
 
     chunks = build_chunks(articles)
     print(f"Built {len(chunks)} chunks from articles.")
 
-    texts = [c["text"] for c in chunks]
-    embeddings = embed_texts(texts)
-    for c, vec in zip(chunks, embeddings):
-        c["embedding"] = vec
+    # Reuse cached embeddings for unchanged chunks; only embed the rest.
+    store = EmbeddingStore()
+    keys = [make_embedding_key(EMBEDDING_MODEL, c["text"]) for c in chunks]
+    cached = store.get_many(keys)
+    hits: List[Dict] = []
+    hit_vecs: List[np.ndarray] = []
+    misses: List[Dict] = []
+    miss_keys: List[str] = []
+    for c, key in zip(chunks, keys):
+        if key in cached:
+            hits.append(c)
+            hit_vecs.append(cached[key])
+        else:
+            misses.append(c)
+            miss_keys.append(key)
+    print(f"Embedding cache: {len(hits)} hits, {len(misses)} misses.")
+
+    index = await run_pinecone(get_index)
+    # Bounded so producers wait while the upserter is behind, instead
+    # of buffering the whole corpus in memory.
+    queue: asyncio.Queue = asyncio.Queue(maxsize=EMBED_MAX_CONCURRENCY)
+    sem = asyncio.Semaphore(EMBED_MAX_CONCURRENCY)
+    client = make_async_openai_client()
+
+    async def embed_and_enqueue(batch: List[Dict], batch_keys: List[str]) -> None:
+        embeddings = await _embed_batch(client, [c["text"] for c in batch], sem)
+        store.put_many(zip(batch_keys, embeddings))
+        await queue.put((batch, embeddings))
+
+    async def enqueue_hits() -> None:
+        for i in range(0, len(hits), UPSERT_BATCH_SIZE):
+            group_vecs = np.stack(hit_vecs[i : i + UPSERT_BATCH_SIZE])
+            await queue.put(
+                (
+                    hits[i : i + UPSERT_BATCH_SIZE],
+                    group_vecs.astype(EMBEDDING_DTYPE, copy=False),
+                )
+            )
+
+    async def produce() -> None:
+        async with asyncio.TaskGroup() as producers:
+            producers.create_task(enqueue_hits())
+            for i in range(0, len(misses), EMBED_BATCH_SIZE):
+                producers.create_task(
+                    embed_and_enqueue(
+                        misses[i : i + EMBED_BATCH_SIZE],
+                        miss_keys[i : i + EMBED_BATCH_SIZE],
+                    )
+                )
+        await queue.put(None)
+
+    # A TaskGroup cancels (and waits for) every sibling as soon as one
+    # fails, so nothing is still using the store or client during cleanup.
+    try:
+        async with asyncio.TaskGroup() as tg:
+            upserter = tg.create_task(_upsert_worker(index, queue))
+            tg.create_task(produce())
+        upserted = upserter.result()
+    finally:
+        store.close()
+        await client.close()
+
+    print(f"Ingestion completed. Upserted {upserted} vectors.")
 
-    upsert_resp = upsert_chunks(chunks)
-    print(f"Ingestion completed. Upsert response: {upsert_resp}")
+
+def run_ingestion_once() -> None:
+    """
+    Synchronous entry point for `run_ingestion_once_async`.
+    From a running event loop (e.g. Jupyter), await that instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        asyncio.run(run_ingestion_once_async())
+        return
+    raise RuntimeError(
+        "run_ingestion_once() can't be called from a running event loop; "
+        "use `await run_ingestion_once_async()` instead."
+    )
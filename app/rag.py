@@ -1,26 +1,90 @@
-from typing import List
+import threading
+from typing import AsyncIterator, Dict, List
 
-from openai import OpenAI
-from pinecone import Pinecone
+import numpy as np
 
-from app.config import OPENAI_API_KEY, PINECONE_API_KEY, PINECONE_INDEX_NAME
+from app.batcher import EmbeddingBatcher
+from app.cache import get_embedding_cache, make_query_key
+from app.clients import (
+    get_async_openai_client,
+    get_openai_client,
+    get_pinecone_client,
+    run_pinecone,
+)
+from app.config import PINECONE_INDEX_NAME, RETRIEVAL_SCORE_THRESHOLD
 
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
-pinecone_client = Pinecone(api_key=PINECONE_API_KEY)
-index = pinecone_client.Index(PINECONE_INDEX_NAME)
+__all__ = [
+    "NO_CONTEXT_ANSWER",
+    "answer_with_rag",
+    "answer_with_rag_async",
+    "build_context_from_matches",
+    "build_messages",
+    "embed_query",
+    "embed_query_async",
+    "embedding_batcher",
+    "get_index",
+    "has_confident_match",
+    "retrieve",
+    "retrieve_async",
+    "retrieve_by_vector_async",
+    "stream_answer_with_rag",
+]
+
+embedding_batcher = EmbeddingBatcher(get_async_openai_client)
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Pinecone index handle, resolved on first use rather than at import
+    (resolving it looks up the index host over the network).
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = get_pinecone_client().Index(PINECONE_INDEX_NAME)
+    return _index
 
 
 # ---------- Embedding & retrieval ----------
 
-def embed_query(query: str) -> List[float]:
+def embed_query(query: str) -> np.ndarray:
     """
     Embed a user query using the same embedding model as the corpus.
+    Repeated queries are served from the in-process embedding cache.
     """
-    resp = openai_client.embeddings.create(
+    cache = get_embedding_cache()
+    key = make_query_key(query)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    resp = get_openai_client().embeddings.create(
         model="text-embedding-3-small",
         input=query,
     )
-    return resp.data[0].embedding
+    vec = np.asarray(resp.data[0].embedding, dtype=np.float32)
+    cache.put(key, vec)
+    return vec
+
+
+async def embed_query_async(query: str) -> np.ndarray:
+    """
+    Async `embed_query`: cache misses go through the embedding batcher,
+    so concurrent requests share one OpenAI embeddings call.
+    """
+    cache = get_embedding_cache()
+    key = make_query_key(query)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    vec = await embedding_batcher.embed(query)
+    cache.put(key, vec)
+    return vec
 
 
 def retrieve(query: str, top_k: int = 5):
@@ -29,8 +93,12 @@ def retrieve(query: str, top_k: int = 5):
     Returns the raw Pinecone matches list.
     """
     query_vec = embed_query(query)
-    res = index.query(
-        vector=query_vec,
+    return _query_index(query_vec, top_k)
+
+
+def _query_index(query_vec: np.ndarray, top_k: int):
+    res = get_index().query(
+        vector=query_vec.tolist(),
         top_k=top_k,
         include_metadata=True,
     )
@@ -38,6 +106,23 @@ def retrieve(query: str, top_k: int = 5):
     return res["matches"]
 
 
+async def retrieve_async(query: str, top_k: int = 5):
+    """
+    Async `retrieve`: the query is embedded via the batcher and the
+    blocking Pinecone query runs on the Pinecone executor instead of
+    on the event loop.
+    """
+    query_vec = await embed_query_async(query)
+    return await retrieve_by_vector_async(query_vec, top_k=top_k)
+
+
+async def retrieve_by_vector_async(query_vec: np.ndarray, top_k: int = 5):
+    """
+    Pinecone search for an already-embedded query.
+    """
+    return await run_pinecone(_query_index, query_vec, top_k)
+
+
 # ---------- Context building & LLM answer ----------
 
 def build_context_from_matches(matches) -> str:
@@ -56,22 +141,27 @@ def build_context_from_matches(matches) -> str:
     return "\n\n---\n\n".join(parts)
 
 
-def answer_with_rag(query: str, top_k: int = 5) -> str:
+NO_CONTEXT_ANSWER = (
+    "I couldn't find any relevant information "
+    "in the current set of help center articles."
+)
+
+
+def has_confident_match(matches) -> bool:
     """
-    End-to-end RAG answer:
-    - retrieve relevant chunks from Pinecone
-    - build a context string
-    - call GPT model to generate an answer grounded in context
+    Whether the best match (Pinecone returns them sorted by score) is
+    similar enough to be worth sending to the LLM.
     """
-    matches = retrieve(query, top_k=top_k)
-    if not matches:
-        return (
-            "I couldn't find any relevant information "
-            "in the current set of help center articles."
-        )
+    return bool(matches) and matches[0]["score"] >= RETRIEVAL_SCORE_THRESHOLD
 
+
+def build_messages(query: str, matches) -> List[Dict[str, str]]:
+    """
+    Build the chat messages (system prompt + context + question)
+    for the retrieved matches.
+    """
     context = build_context_from_matches(matches)
-    messages = [
+    return [
         {
             "role": "system",
             "content": (
@@ -86,9 +176,61 @@ def answer_with_rag(query: str, top_k: int = 5) -> str:
         },
     ]
 
-    resp = openai_client.chat.completions.create(
+
+def answer_with_rag(query: str, matches) -> str:
+    """
+    RAG answer over already-retrieved matches:
+    - skip the LLM if the best match scores below RETRIEVAL_SCORE_THRESHOLD
+    - build a context string
+    - call GPT model to generate an answer grounded in context
+    """
+    if not has_confident_match(matches):
+        return NO_CONTEXT_ANSWER
+
+    resp = get_openai_client().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=build_messages(query, matches),
+        temperature=0.1,
+    )
+    return resp.choices[0].message.content
+
+
+async def answer_with_rag_async(query: str, matches) -> str:
+    """
+    Async version of `answer_with_rag` using the AsyncOpenAI client.
+    """
+    if not has_confident_match(matches):
+        return NO_CONTEXT_ANSWER
+
+    resp = await get_async_openai_client().chat.completions.create(
         model="gpt-4o-mini",
-        messages=messages,
+        messages=build_messages(query, matches),
         temperature=0.1,
     )
     return resp.choices[0].message.content
+
+
+async def stream_answer_with_rag(query: str, matches) -> AsyncIterator[str]:
+    """
+    Streaming version of `answer_with_rag_async`: yields answer tokens
+    as soon as the model emits them.
+    """
+    if not has_confident_match(matches):
+        yield NO_CONTEXT_ANSWER
+        return
+
+    stream = await get_async_openai_client().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=build_messages(query, matches),
+        temperature=0.1,
+        stream=True,
+    )
+    # Close the stream even if the client disconnects mid-answer, so its
+    # pooled connection is released right away.
+    async with stream:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta